@@ -4,7 +4,7 @@ package.name = comodato_viewer
 package.domain = org.valdeci
 source.dir = .
 source.include_exts = py,kv,db,png
-source.exclude_patterns = __pycache__/*,*.pyc,*.pyo,*.pyd,*.swp,*.git/*,*.gitignore,old.db
+source.exclude_patterns = __pycache__/*,*.pyc,*.pyo,*.pyd,*.swp,*.git/*,*.gitignore,old.db,cli.py,test_*.py
 version = 1.0
 requirements = python3,kivy==2.3.1,certifi,filetype
 orientation = portrait
@@ -16,7 +16,7 @@ log_level = 2
 warn_on_root = 1
 
 [android]
-android.permissions = INTERNET
+android.permissions = INTERNET,WRITE_EXTERNAL_STORAGE
 android.presplash_color = #111621
 android.api = 33
 android.minapi = 21
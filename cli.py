@@ -0,0 +1,123 @@
+"""Consulta em lote da base sem interface gráfica.
+
+Uso:
+    python cli.py clientes codigos.txt > saida.jsonl
+    python cli.py contratos --workers 4 < contratos.txt
+    python cli.py busca termos.txt --db /caminho/base.db
+
+Lê uma chave por linha (arquivo ou stdin) e escreve uma linha JSON por
+chave, na mesma ordem da entrada.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from database import DB, DB_NAME
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOOKUP_BATCH = 5000
+
+_worker_db = None
+
+def read_keys(stream):
+    for line in stream:
+        key = line.strip()
+        if key:
+            yield key
+
+def batched(keys, size: int):
+    batch = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def resolve_batch(db: DB, kind: str, keys: list) -> list:
+    """Resolve um lote de chaves e devolve os registros na ordem da entrada."""
+    if kind == "busca":
+        found = db.search_terms(keys)
+        return [
+            {"key": key, "found": key in found, "clientes": found.get(key, [])}
+            for key in keys
+        ]
+
+    if kind == "clientes":
+        found = db.lookup_clientes(keys)
+        field = "cliente"
+    else:
+        found = db.lookup_contratos(keys)
+        field = "contrato"
+    out = []
+    for key in keys:
+        record = {"key": key, "found": key in found}
+        if key in found:
+            record[field] = found[key]
+        out.append(record)
+    return out
+
+def _init_worker(db_path: str):
+    global _worker_db
+    _worker_db = DB(db_path)
+
+def _resolve_in_worker(kind: str, keys: list) -> list:
+    return resolve_batch(_worker_db, kind, keys)
+
+def run(db_path: str, kind: str, stream, out, batch_size: int = LOOKUP_BATCH, workers: int = 1) -> int:
+    """Processa todas as chaves do stream e retorna quantas foram escritas."""
+    batches = batched(read_keys(stream), batch_size)
+    written = 0
+
+    def emit(records):
+        nonlocal written
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False))
+            out.write("\n")
+        written += len(records)
+
+    if workers <= 1:
+        db = DB(db_path)
+        for keys in batches:
+            emit(resolve_batch(db, kind, keys))
+        return written
+
+    # Mantém no máximo 2 lotes por processo em voo para não ler a entrada toda.
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(db_path,)) as pool:
+        pending = deque()
+        for keys in batches:
+            pending.append(pool.submit(_resolve_in_worker, kind, keys))
+            if len(pending) >= workers * 2:
+                emit(pending.popleft().result())
+        while pending:
+            emit(pending.popleft().result())
+    return written
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Consulta em lote de clientes, contratos ou termos de busca.")
+    parser.add_argument("kind", choices=["clientes", "contratos", "busca"], help="tipo de chave da entrada")
+    parser.add_argument("input", nargs="?", default="-", help="arquivo com uma chave por linha (padrão: stdin)")
+    parser.add_argument("--db", default=os.path.join(BASE_DIR, DB_NAME), help="caminho da base SQLite")
+    parser.add_argument("--batch-size", type=int, default=LOOKUP_BATCH, help="chaves por consulta")
+    parser.add_argument("--workers", type=int, default=1, help="processos em paralelo")
+    # Aceita o arquivo antes ou depois das opções (ex.: --workers 2 codigos.txt).
+    args = parser.parse_intermixed_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"base não encontrada: {args.db}")
+    if args.batch_size < 1 or args.workers < 1:
+        parser.error("--batch-size e --workers devem ser maiores que zero")
+
+    if args.input == "-":
+        run(args.db, args.kind, sys.stdin, sys.stdout, args.batch_size, args.workers)
+    else:
+        with open(args.input, "r", encoding="utf-8") as stream:
+            run(args.db, args.kind, stream, sys.stdout, args.batch_size, args.workers)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
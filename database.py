@@ -0,0 +1,442 @@
+import itertools
+import sqlite3
+
+DB_NAME = "base.db"
+FETCH_BATCH = 1000
+CANCEL_CHECK_OPS = 10000
+
+class DB:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def connect(self):
+        con = sqlite3.connect(self.db_path)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def list_contracts(self, q: str = ""):
+        q = (q or "").strip()
+        where = []
+        params = []
+
+        if q:
+            where.append("""
+                (
+                    cl.codigo_cliente LIKE ?
+                    OR cl.nome_fantasia LIKE ?
+                    OR cl.razao_social LIKE ?
+                    OR cl.cidade LIKE ?
+                    OR cl.supervisor LIKE ?
+                    OR cl.vendedor LIKE ?
+                    OR cl.pasta LIKE ?
+                )
+            """)
+            like = f"%{q}%"
+            params.extend([like, like, like, like, like, like, like])
+
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+
+        sql = f"""
+            SELECT
+                c.numero_contrato,
+                c.emissao,
+                c.vencimento,
+                c.tipo,
+                cl.codigo_cliente,
+                cl.nome_fantasia,
+                cl.razao_social,
+                cl.cidade,
+                cl.vendedor,
+                cl.supervisor,
+                cl.pasta
+            FROM CONTRATO c
+            JOIN CLIENTE cl ON cl.codigo_cliente = c.codigo_cliente
+            {where_sql}
+            ORDER BY cl.codigo_cliente ASC, c.vencimento ASC, c.numero_contrato ASC
+            LIMIT 1000
+        """
+
+        with self.connect() as con:
+            rows = con.execute(sql, params).fetchall()
+
+        clientes = {}
+        for r in rows:
+            cod = r["codigo_cliente"]
+            if cod not in clientes:
+                clientes[cod] = {
+                    "codigo_cliente": r["codigo_cliente"],
+                    "nome_fantasia": r["nome_fantasia"],
+                    "razao_social": r["razao_social"],
+                    "cidade": r["cidade"],
+                    "vendedor": r["vendedor"],
+                    "supervisor": r["supervisor"],
+                    "pasta": r["pasta"],
+                    "contratos": [],
+                }
+            clientes[cod]["contratos"].append({
+                "numero_contrato": r["numero_contrato"],
+                "emissao": r["emissao"],
+                "vencimento": r["vencimento"],
+                "tipo": r["tipo"],
+            })
+
+        items = []
+        for cliente in clientes.values():
+            contratos = cliente["contratos"]
+            count = len(contratos)
+            items.append({
+                "codigo_cliente": cliente["codigo_cliente"],
+                "nome_fantasia": cliente["nome_fantasia"],
+                "razao_social": cliente["razao_social"],
+                "cidade": cliente["cidade"],
+                "vendedor": cliente["vendedor"],
+                "supervisor": cliente["supervisor"],
+                "pasta": cliente["pasta"],
+                "qtd_contratos": str(count),
+                "contratos": [c["numero_contrato"] for c in contratos],
+            })
+        return items
+
+    def get_contract_detail(self, numero_contrato: str):
+        sql = """
+            SELECT
+                c.numero_contrato,
+                c.emissao,
+                c.vencimento,
+                c.tipo,
+                cl.codigo_cliente,
+                cl.nome_fantasia,
+                cl.razao_social,
+                cl.cidade,
+                cl.vendedor,
+                cl.supervisor,
+                cl.pasta
+            FROM CONTRATO c
+            JOIN CLIENTE cl ON cl.codigo_cliente = c.codigo_cliente
+            WHERE c.numero_contrato = ?
+        """
+        sql_prod = """
+            SELECT id_produto, codigo_produto, descricao, quantidade
+            FROM PRODUTO
+            WHERE numero_contrato = ?
+            ORDER BY descricao ASC
+        """
+        with self.connect() as con:
+            contrato = con.execute(sql, (numero_contrato,)).fetchone()
+            produtos = con.execute(sql_prod, (numero_contrato,)).fetchall()
+
+        if not contrato:
+            return None
+
+        produtos_list = [{
+            "id_produto": p["id_produto"],
+            "codigo_produto": p["codigo_produto"],
+            "descricao": p["descricao"],
+            "quantidade": p["quantidade"],
+        } for p in produtos]
+
+        data = dict(contrato)
+        data["produtos"] = produtos_list
+        return data
+
+    def get_vendedores_unicos(self) -> list:
+        sql = "SELECT DISTINCT vendedor FROM CLIENTE ORDER BY vendedor ASC"
+        with self.connect() as con:
+            rows = con.execute(sql).fetchall()
+        return [r["vendedor"] for r in rows if r["vendedor"]]
+
+    def get_pastas_unicas(self) -> list:
+        sql = "SELECT DISTINCT pasta FROM CLIENTE ORDER BY pasta ASC"
+        with self.connect() as con:
+            rows = con.execute(sql).fetchall()
+        return [r["pasta"] for r in rows if r["pasta"]]
+
+    def _advanced_where(self, q: str = "", vendedor: str = "", pastas: list = None):
+        q = (q or "").strip()
+        if pastas is None:
+            pastas = []
+
+        where = []
+        params = []
+
+        if q:
+            where.append("""
+                (
+                    cl.codigo_cliente LIKE ?
+                    OR cl.nome_fantasia LIKE ?
+                    OR cl.razao_social LIKE ?
+                    OR cl.cidade LIKE ?
+                    OR cl.supervisor LIKE ?
+                    OR cl.vendedor LIKE ?
+                    OR cl.pasta LIKE ?
+                )
+            """)
+            like = f"%{q}%"
+            params.extend([like, like, like, like, like, like, like])
+
+        if vendedor:
+            where.append("cl.vendedor = ?")
+            params.append(vendedor)
+
+        if pastas:
+            placeholders = ",".join(["?" for _ in pastas])
+            where.append(f"cl.pasta IN ({placeholders})")
+            params.extend(pastas)
+
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+        return where_sql, params
+
+    def _watch_cancel(self, con, cancel_event):
+        """Aborta a consulta em andamento (sqlite3.OperationalError) ao cancelar."""
+        if cancel_event is not None:
+            con.set_progress_handler(cancel_event.is_set, CANCEL_CHECK_OPS)
+
+    def count_export_rows(self, q: str = "", vendedor: str = "", pastas: list = None,
+                          cancel_event=None) -> int:
+        where_sql, params = self._advanced_where(q, vendedor, pastas)
+        sql = f"""
+            SELECT COUNT(*)
+            FROM CONTRATO c
+            JOIN CLIENTE cl ON cl.codigo_cliente = c.codigo_cliente
+            LEFT JOIN PRODUTO p ON p.numero_contrato = c.numero_contrato
+            {where_sql}
+        """
+        with self.connect() as con:
+            self._watch_cancel(con, cancel_event)
+            return con.execute(sql, params).fetchone()[0]
+
+    def iter_export_rows(self, q: str = "", vendedor: str = "", pastas: list = None,
+                         batch_size: int = FETCH_BATCH, cancel_event=None):
+        """Gera uma linha por produto (ou por contrato sem produto), sem LIMIT."""
+        where_sql, params = self._advanced_where(q, vendedor, pastas)
+        sql = f"""
+            SELECT
+                cl.codigo_cliente,
+                cl.nome_fantasia,
+                cl.razao_social,
+                cl.cidade,
+                cl.vendedor,
+                cl.supervisor,
+                cl.pasta,
+                c.numero_contrato,
+                c.emissao,
+                c.vencimento,
+                c.tipo,
+                p.codigo_produto,
+                p.descricao,
+                p.quantidade
+            FROM CONTRATO c
+            JOIN CLIENTE cl ON cl.codigo_cliente = c.codigo_cliente
+            LEFT JOIN PRODUTO p ON p.numero_contrato = c.numero_contrato
+            {where_sql}
+            ORDER BY cl.codigo_cliente ASC, c.vencimento ASC, c.numero_contrato ASC, p.descricao ASC
+        """
+        con = self.connect()
+        self._watch_cancel(con, cancel_event)
+        try:
+            cur = con.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            con.close()
+
+    def list_contracts_advanced(self, q: str = "", vendedor: str = "", pastas: list = None):
+        where_sql, params = self._advanced_where(q, vendedor, pastas)
+
+        sql = f"""
+            SELECT
+                c.numero_contrato,
+                c.emissao,
+                c.vencimento,
+                c.tipo,
+                cl.codigo_cliente,
+                cl.nome_fantasia,
+                cl.razao_social,
+                cl.cidade,
+                cl.vendedor,
+                cl.supervisor,
+                cl.pasta
+            FROM CONTRATO c
+            JOIN CLIENTE cl ON cl.codigo_cliente = c.codigo_cliente
+            {where_sql}
+            ORDER BY cl.codigo_cliente ASC, c.vencimento ASC, c.numero_contrato ASC
+            LIMIT 1000
+        """
+        with self.connect() as con:
+            rows = con.execute(sql, params).fetchall()
+        return self._group_by_cliente(rows)
+
+    def _group_by_cliente(self, rows):
+        clientes = {}
+        for r in rows:
+            cod = r["codigo_cliente"]
+            if cod not in clientes:
+                clientes[cod] = {
+                    "codigo_cliente": r["codigo_cliente"],
+                    "nome_fantasia": r["nome_fantasia"],
+                    "razao_social": r["razao_social"],
+                    "cidade": r["cidade"],
+                    "vendedor": r["vendedor"],
+                    "supervisor": r["supervisor"],
+                    "pasta": r["pasta"],
+                    "contratos": [],
+                }
+            clientes[cod]["contratos"].append({
+                "numero_contrato": r["numero_contrato"],
+                "emissao": r["emissao"],
+                "vencimento": r["vencimento"],
+                "tipo": r["tipo"],
+            })
+
+        items = []
+        for cliente in clientes.values():
+            contratos = cliente["contratos"]
+            count = len(contratos)
+            items.append({
+                "codigo_cliente": cliente["codigo_cliente"],
+                "nome_fantasia": cliente["nome_fantasia"],
+                "razao_social": cliente["razao_social"],
+                "cidade": cliente["cidade"],
+                "vendedor": cliente["vendedor"],
+                "supervisor": cliente["supervisor"],
+                "pasta": cliente["pasta"],
+                "qtd_contratos": str(count),
+                "contratos": [c["numero_contrato"] for c in contratos],
+            })
+        return items
+
+    def _load_lookup_keys(self, con, keys):
+        con.execute("CREATE TEMP TABLE IF NOT EXISTS lookup_keys (k TEXT PRIMARY KEY)")
+        con.execute("DELETE FROM lookup_keys")
+        con.executemany(
+            "INSERT OR IGNORE INTO lookup_keys (k) VALUES (?)",
+            ((str(k),) for k in keys),
+        )
+
+    def search_terms(self, termos: list) -> dict:
+        """Resolve vários termos de busca com um único join; retorna {termo: itens}.
+
+        Usa os mesmos campos de busca de list_contracts_advanced, mas sem LIMIT.
+        """
+        campos = [
+            "cl.codigo_cliente", "cl.nome_fantasia", "cl.razao_social", "cl.cidade",
+            "cl.supervisor", "cl.vendedor", "cl.pasta",
+        ]
+        match_sql = " OR ".join(f"{campo} LIKE '%' || lk.k || '%'" for campo in campos)
+        sql = f"""
+            SELECT
+                lk.k AS termo,
+                c.numero_contrato,
+                c.emissao,
+                c.vencimento,
+                c.tipo,
+                cl.codigo_cliente,
+                cl.nome_fantasia,
+                cl.razao_social,
+                cl.cidade,
+                cl.vendedor,
+                cl.supervisor,
+                cl.pasta
+            FROM lookup_keys lk
+            JOIN CLIENTE cl ON ({match_sql})
+            JOIN CONTRATO c ON c.codigo_cliente = cl.codigo_cliente
+            ORDER BY lk.k ASC, cl.codigo_cliente ASC, c.vencimento ASC, c.numero_contrato ASC
+        """
+        with self.connect() as con:
+            self._load_lookup_keys(con, termos)
+            rows = con.execute(sql).fetchall()
+        return {
+            termo: self._group_by_cliente(grupo)
+            for termo, grupo in itertools.groupby(rows, key=lambda r: r["termo"])
+        }
+
+    def lookup_clientes(self, codigos: list) -> dict:
+        """Resolve vários códigos de cliente com um único join; retorna {codigo: item}."""
+        sql = """
+            SELECT
+                cl.codigo_cliente,
+                cl.nome_fantasia,
+                cl.razao_social,
+                cl.cidade,
+                cl.vendedor,
+                cl.supervisor,
+                cl.pasta,
+                c.numero_contrato,
+                c.emissao,
+                c.vencimento,
+                c.tipo
+            FROM lookup_keys lk
+            JOIN CLIENTE cl ON cl.codigo_cliente = lk.k
+            LEFT JOIN CONTRATO c ON c.codigo_cliente = cl.codigo_cliente
+            ORDER BY cl.codigo_cliente ASC, c.vencimento ASC, c.numero_contrato ASC
+        """
+        clientes = {}
+        with self.connect() as con:
+            self._load_lookup_keys(con, codigos)
+            for r in con.execute(sql):
+                cod = r["codigo_cliente"]
+                if cod not in clientes:
+                    clientes[cod] = {
+                        "codigo_cliente": r["codigo_cliente"],
+                        "nome_fantasia": r["nome_fantasia"],
+                        "razao_social": r["razao_social"],
+                        "cidade": r["cidade"],
+                        "vendedor": r["vendedor"],
+                        "supervisor": r["supervisor"],
+                        "pasta": r["pasta"],
+                        "contratos": [],
+                    }
+                if r["numero_contrato"] is not None:
+                    clientes[cod]["contratos"].append({
+                        "numero_contrato": r["numero_contrato"],
+                        "emissao": r["emissao"],
+                        "vencimento": r["vencimento"],
+                        "tipo": r["tipo"],
+                    })
+        return clientes
+
+    def lookup_contratos(self, numeros: list) -> dict:
+        """Resolve vários contratos (com produtos) via tabela temporária; retorna {numero: detalhe}."""
+        sql = """
+            SELECT
+                c.numero_contrato,
+                c.emissao,
+                c.vencimento,
+                c.tipo,
+                cl.codigo_cliente,
+                cl.nome_fantasia,
+                cl.razao_social,
+                cl.cidade,
+                cl.vendedor,
+                cl.supervisor,
+                cl.pasta
+            FROM lookup_keys lk
+            JOIN CONTRATO c ON c.numero_contrato = lk.k
+            JOIN CLIENTE cl ON cl.codigo_cliente = c.codigo_cliente
+        """
+        sql_prod = """
+            SELECT p.numero_contrato, p.id_produto, p.codigo_produto, p.descricao, p.quantidade
+            FROM lookup_keys lk
+            JOIN PRODUTO p ON p.numero_contrato = lk.k
+            ORDER BY p.numero_contrato ASC, p.descricao ASC
+        """
+        contratos = {}
+        with self.connect() as con:
+            self._load_lookup_keys(con, numeros)
+            for r in con.execute(sql):
+                data = dict(r)
+                data["produtos"] = []
+                contratos[r["numero_contrato"]] = data
+            for p in con.execute(sql_prod):
+                contrato = contratos.get(p["numero_contrato"])
+                if contrato is not None:
+                    contrato["produtos"].append({
+                        "id_produto": p["id_produto"],
+                        "codigo_produto": p["codigo_produto"],
+                        "descricao": p["descricao"],
+                        "quantidade": p["quantidade"],
+                    })
+        return contratos
@@ -0,0 +1,227 @@
+import csv
+import io
+import itertools
+import os
+import re
+import sqlite3
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape as xml_escape
+
+EXPORT_BATCH = 1000
+XLSX_MAX_ROWS = 1048576
+EXPORT_COLUMNS = [
+    ("codigo_cliente", "Código cliente"),
+    ("nome_fantasia", "Nome fantasia"),
+    ("razao_social", "Razão social"),
+    ("cidade", "Cidade"),
+    ("vendedor", "Vendedor"),
+    ("supervisor", "Supervisor"),
+    ("pasta", "Pasta"),
+    ("numero_contrato", "Contrato"),
+    ("emissao", "Emissão"),
+    ("vencimento", "Vencimento"),
+    ("tipo", "Tipo"),
+    ("codigo_produto", "Código produto"),
+    ("descricao", "Descrição"),
+    ("quantidade", "Quantidade"),
+]
+
+def write_csv(path: str, header: list, rows):
+    with open(path, "w", newline="", encoding="utf-8-sig") as fp:
+        writer = csv.writer(fp, delimiter=";")
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+
+def _xlsx_col(index: int) -> str:
+    name = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        name = chr(65 + rem) + name
+    return name
+
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+def _xlsx_cell(ref: str, value) -> str:
+    if value is None or value == "":
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = xml_escape(_XML_ILLEGAL.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def _xlsx_write_sheet(zf, name: str, header: list, rows):
+    with zf.open(name, "w", force_zip64=True) as raw:
+        out = io.TextIOWrapper(raw, encoding="utf-8")
+        out.write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<sheetData>'
+        )
+        cols = [_xlsx_col(col) for col in range(len(header))]
+        for row_index, row in enumerate(itertools.chain([header], rows), start=1):
+            cells = "".join(
+                _xlsx_cell(f"{col}{row_index}", value)
+                for col, value in zip(cols, row)
+            )
+            out.write(f'<row r="{row_index}">{cells}</row>')
+        out.write("</sheetData></worksheet>")
+        out.flush()
+        out.detach()
+
+def write_xlsx(path: str, header: list, rows):
+    """Grava uma planilha XLSX mínima escrevendo as folhas em streaming no zip.
+
+    Cada folha recebe no máximo XLSX_MAX_ROWS linhas (cabeçalho incluso), o
+    limite do Excel; o restante continua em folhas "Contratos 2", "Contratos 3"...
+    """
+    rows = iter(rows)
+    per_sheet = XLSX_MAX_ROWS - 1
+    sheets = 0
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        while True:
+            first = next(rows, None)
+            if first is None and sheets:
+                break
+            sheets += 1
+            chunk = itertools.islice(rows, per_sheet - 1)
+            if first is not None:
+                chunk = itertools.chain([first], chunk)
+            _xlsx_write_sheet(zf, f"xl/worksheets/sheet{sheets}.xml", header, chunk)
+            if first is None:
+                break
+
+        numbers = range(1, sheets + 1)
+        zf.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + "".join(
+                f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for n in numbers
+            )
+            + '</Types>'
+        ))
+        zf.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        zf.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets>'
+            + "".join(
+                f'<sheet name="{"Contratos" if n == 1 else f"Contratos {n}"}" sheetId="{n}" r:id="rId{n}"/>'
+                for n in numbers
+            )
+            + '</sheets></workbook>'
+        ))
+        zf.writestr("xl/_rels/workbook.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(
+                f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                for n in numbers
+            )
+            + '</Relationships>'
+        ))
+
+EXPORT_WRITERS = {
+    "csv": write_csv,
+    "xlsx": write_xlsx,
+}
+
+class ExportCancelled(Exception):
+    pass
+
+def _current_umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+def export_filtered(db, path: str, fmt: str = "csv", q: str = "", vendedor: str = "",
+                    pastas: list = None, progress=None, cancel_event=None, format_date=None):
+    """Exporta a visão filtrada (contratos + produtos) sem carregar tudo em memória.
+
+    As linhas vêm do SQLite em lotes e passam por geradores até o writer.
+    progress(feitas, total) é chamado a cada lote; se cancel_event for
+    sinalizado (inclusive durante a contagem e a ordenação no SQLite) o
+    arquivo parcial é descartado e retorna False. format_date, se informado,
+    formata as colunas de emissão e vencimento.
+    """
+    writer = EXPORT_WRITERS[fmt]
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    try:
+        total = db.count_export_rows(q=q, vendedor=vendedor, pastas=pastas,
+                                     cancel_event=cancel_event)
+    except sqlite3.OperationalError:
+        if cancelled():
+            return False
+        raise
+    if cancelled():
+        return False
+    if progress:
+        progress(0, total)
+    keys = [key for key, _ in EXPORT_COLUMNS]
+    header = [label for _, label in EXPORT_COLUMNS]
+
+    date_cols = [keys.index("emissao"), keys.index("vencimento")] if format_date else []
+    date_cache = {}
+
+    def formatted(rows):
+        for r in rows:
+            values = [r[key] for key in keys]
+            for col in date_cols:
+                raw = values[col]
+                if raw not in date_cache:
+                    date_cache[raw] = format_date(raw)
+                values[col] = date_cache[raw]
+            yield values
+
+    def tracked(rows):
+        done = 0
+        for row in rows:
+            yield row
+            done += 1
+            if done % EXPORT_BATCH == 0:
+                if cancelled():
+                    raise ExportCancelled()
+                if progress:
+                    progress(done, total)
+        if progress:
+            progress(done, total)
+
+    dst_dir = os.path.dirname(path) or "."
+    os.makedirs(dst_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=f".{fmt}", dir=dst_dir)
+    os.close(fd)
+    try:
+        rows = db.iter_export_rows(q=q, vendedor=vendedor, pastas=pastas,
+                                   cancel_event=cancel_event)
+        writer(tmp_path, header, tracked(formatted(rows)))
+        # mkstemp cria o arquivo como 0600; usa as permissões normais do umask.
+        os.chmod(tmp_path, 0o666 & ~_current_umask())
+        os.replace(tmp_path, path)
+    except ExportCancelled:
+        return False
+    except sqlite3.OperationalError:
+        if cancelled():
+            return False
+        raise
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    return True
@@ -3,14 +3,9 @@ import shutil
 import sqlite3
 import ssl
 import tempfile
+import threading
 from datetime import date, datetime
 from urllib.error import URLError, HTTPError
-from urllib.request import urlopen, Request
-
-try:
-    import certifi
-except Exception:
-    certifi = None
 
 from kivy.app import App
 from kivy.lang import Builder
@@ -28,13 +23,18 @@ from kivy.uix.popup import Popup
 from kivy.uix.modalview import ModalView
 from kivy.utils import platform
 
+from database import DB, DB_NAME
+from export import export_filtered
+from mirrors import MIRROR_SCORES_FILE, download_db_bytes
+
 BASE_DIR = os.path.dirname(__file__)
 KV_FILE = os.path.join(BASE_DIR, "app.kv")
-DB_NAME = "base.db"
 DB_REMOTE_URLS = [
     "https://raw.githubusercontent.com/Valdeci-cpd/aplicativo-kivy/main/base.db",
     "https://github.com/Valdeci-cpd/aplicativo-kivy/raw/refs/heads/main/base.db",
 ]
+EXPORT_DIR = "exports"
+EXPORT_SHARED_DIR = "ComodatoViewer"
 
 Clock.max_iteration = 20
 
@@ -77,26 +77,6 @@ def normalize_tipo(value: str) -> str:
         return "PROVISÓRIO"
     return tipo_upper
 
-def fetch_url_bytes(url: str, timeout: int = 30) -> bytes:
-    context = None
-    if certifi:
-        context = ssl.create_default_context(cafile=certifi.where())
-    req = Request(url, headers={"User-Agent": "ComodatoViewer/1.0"})
-    if context:
-        with urlopen(req, timeout=timeout, context=context) as response:
-            return response.read()
-    with urlopen(req, timeout=timeout) as response:
-        return response.read()
-
-def download_db_bytes(urls: list, timeout: int = 30):
-    errors = []
-    for url in urls:
-        try:
-            return fetch_url_bytes(url, timeout=timeout), url
-        except (URLError, HTTPError, ssl.SSLError) as exc:
-            errors.append(f"{url} -> {exc}")
-    raise URLError("Falha ao baixar a base.\n" + "\n".join(errors))
-
 def validate_db_file(path: str):
     try:
         with sqlite3.connect(path) as con:
@@ -121,245 +101,42 @@ def ensure_db_available() -> str:
         return dst
     return src
 
-class DB:
-    def __init__(self, db_path: str):
-        self.db_path = db_path
-
-    def connect(self):
-        con = sqlite3.connect(self.db_path)
-        con.row_factory = sqlite3.Row
-        return con
-
-    def list_contracts(self, q: str = ""):
-        q = (q or "").strip()
-        where = []
-        params = []
-
-        if q:
-            where.append("""
-                (
-                    cl.codigo_cliente LIKE ?
-                    OR cl.nome_fantasia LIKE ?
-                    OR cl.razao_social LIKE ?
-                    OR cl.cidade LIKE ?
-                    OR cl.supervisor LIKE ?
-                    OR cl.vendedor LIKE ?
-                    OR cl.pasta LIKE ?
-                )
-            """)
-            like = f"%{q}%"
-            params.extend([like, like, like, like, like, like, like])
-
-        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
-
-        sql = f"""
-            SELECT
-                c.numero_contrato,
-                c.emissao,
-                c.vencimento,
-                c.tipo,
-                cl.codigo_cliente,
-                cl.nome_fantasia,
-                cl.razao_social,
-                cl.cidade,
-                cl.vendedor,
-                cl.supervisor,
-                cl.pasta
-            FROM CONTRATO c
-            JOIN CLIENTE cl ON cl.codigo_cliente = c.codigo_cliente
-            {where_sql}
-            ORDER BY cl.codigo_cliente ASC, c.vencimento ASC, c.numero_contrato ASC
-            LIMIT 1000
-        """
-
-        with self.connect() as con:
-            rows = con.execute(sql, params).fetchall()
-
-        clientes = {}
-        for r in rows:
-            cod = r["codigo_cliente"]
-            if cod not in clientes:
-                clientes[cod] = {
-                    "codigo_cliente": r["codigo_cliente"],
-                    "nome_fantasia": r["nome_fantasia"],
-                    "razao_social": r["razao_social"],
-                    "cidade": r["cidade"],
-                    "vendedor": r["vendedor"],
-                    "supervisor": r["supervisor"],
-                    "pasta": r["pasta"],
-                    "contratos": [],
-                }
-            clientes[cod]["contratos"].append({
-                "numero_contrato": r["numero_contrato"],
-                "emissao": r["emissao"],
-                "vencimento": r["vencimento"],
-                "tipo": r["tipo"],
-            })
-
-        items = []
-        for cliente in clientes.values():
-            contratos = cliente["contratos"]
-            count = len(contratos)
-            items.append({
-                "codigo_cliente": cliente["codigo_cliente"],
-                "nome_fantasia": cliente["nome_fantasia"],
-                "razao_social": cliente["razao_social"],
-                "cidade": cliente["cidade"],
-                "vendedor": cliente["vendedor"],
-                "supervisor": cliente["supervisor"],
-                "pasta": cliente["pasta"],
-                "qtd_contratos": str(count),
-                "contratos": [c["numero_contrato"] for c in contratos],
-            })
-        return items
-
-    def get_contract_detail(self, numero_contrato: str):
-        sql = """
-            SELECT
-                c.numero_contrato,
-                c.emissao,
-                c.vencimento,
-                c.tipo,
-                cl.codigo_cliente,
-                cl.nome_fantasia,
-                cl.razao_social,
-                cl.cidade,
-                cl.vendedor,
-                cl.supervisor,
-                cl.pasta
-            FROM CONTRATO c
-            JOIN CLIENTE cl ON cl.codigo_cliente = c.codigo_cliente
-            WHERE c.numero_contrato = ?
-        """
-        sql_prod = """
-            SELECT id_produto, codigo_produto, descricao, quantidade
-            FROM PRODUTO
-            WHERE numero_contrato = ?
-            ORDER BY descricao ASC
-        """
-        with self.connect() as con:
-            contrato = con.execute(sql, (numero_contrato,)).fetchone()
-            produtos = con.execute(sql_prod, (numero_contrato,)).fetchall()
-
-        if not contrato:
-            return None
-
-        produtos_list = [{
-            "id_produto": p["id_produto"],
-            "codigo_produto": p["codigo_produto"],
-            "descricao": p["descricao"],
-            "quantidade": p["quantidade"],
-        } for p in produtos]
-
-        data = dict(contrato)
-        data["produtos"] = produtos_list
-        return data
-
-    def get_vendedores_unicos(self) -> list:
-        sql = "SELECT DISTINCT vendedor FROM CLIENTE ORDER BY vendedor ASC"
-        with self.connect() as con:
-            rows = con.execute(sql).fetchall()
-        return [r["vendedor"] for r in rows if r["vendedor"]]
-
-    def get_pastas_unicas(self) -> list:
-        sql = "SELECT DISTINCT pasta FROM CLIENTE ORDER BY pasta ASC"
-        with self.connect() as con:
-            rows = con.execute(sql).fetchall()
-        return [r["pasta"] for r in rows if r["pasta"]]
-
-    def list_contracts_advanced(self, q: str = "", vendedor: str = "", pastas: list = None):
-        q = (q or "").strip()
-        if pastas is None:
-            pastas = []
-
-        where = []
-        params = []
-
-        if q:
-            where.append("""
-                (
-                    cl.codigo_cliente LIKE ?
-                    OR cl.nome_fantasia LIKE ?
-                    OR cl.razao_social LIKE ?
-                    OR cl.cidade LIKE ?
-                    OR cl.supervisor LIKE ?
-                    OR cl.vendedor LIKE ?
-                    OR cl.pasta LIKE ?
-                )
-            """)
-            like = f"%{q}%"
-            params.extend([like, like, like, like, like, like, like])
-
-        if vendedor:
-            where.append("cl.vendedor = ?")
-            params.append(vendedor)
-
-        if pastas:
-            placeholders = ",".join(["?" for _ in pastas])
-            where.append(f"cl.pasta IN ({placeholders})")
-            params.extend(pastas)
-
-        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
-
-        sql = f"""
-            SELECT
-                c.numero_contrato,
-                c.emissao,
-                c.vencimento,
-                c.tipo,
-                cl.codigo_cliente,
-                cl.nome_fantasia,
-                cl.razao_social,
-                cl.cidade,
-                cl.vendedor,
-                cl.supervisor,
-                cl.pasta
-            FROM CONTRATO c
-            JOIN CLIENTE cl ON cl.codigo_cliente = c.codigo_cliente
-            {where_sql}
-            ORDER BY cl.codigo_cliente ASC, c.vencimento ASC, c.numero_contrato ASC
-            LIMIT 1000
-        """
-        with self.connect() as con:
-            rows = con.execute(sql, params).fetchall()
-
-        clientes = {}
-        for r in rows:
-            cod = r["codigo_cliente"]
-            if cod not in clientes:
-                clientes[cod] = {
-                    "codigo_cliente": r["codigo_cliente"],
-                    "nome_fantasia": r["nome_fantasia"],
-                    "razao_social": r["razao_social"],
-                    "cidade": r["cidade"],
-                    "vendedor": r["vendedor"],
-                    "supervisor": r["supervisor"],
-                    "pasta": r["pasta"],
-                    "contratos": [],
-                }
-            clientes[cod]["contratos"].append({
-                "numero_contrato": r["numero_contrato"],
-                "emissao": r["emissao"],
-                "vencimento": r["vencimento"],
-                "tipo": r["tipo"],
-            })
-
-        items = []
-        for cliente in clientes.values():
-            contratos = cliente["contratos"]
-            count = len(contratos)
-            items.append({
-                "codigo_cliente": cliente["codigo_cliente"],
-                "nome_fantasia": cliente["nome_fantasia"],
-                "razao_social": cliente["razao_social"],
-                "cidade": cliente["cidade"],
-                "vendedor": cliente["vendedor"],
-                "supervisor": cliente["supervisor"],
-                "pasta": cliente["pasta"],
-                "qtd_contratos": str(count),
-                "contratos": [c["numero_contrato"] for c in contratos],
-            })
-        return items
+def request_storage_permission(callback):
+    """Pede acesso ao armazenamento compartilhado (necessário até o Android 9).
+
+    callback() roda na thread do Kivy depois da resposta do usuário, ou na
+    hora se a permissão já existe ou não se aplica (fora do Android).
+    """
+    try:
+        from android.permissions import Permission, check_permission, request_permissions
+    except ImportError:
+        callback()
+        return
+    if check_permission(Permission.WRITE_EXTERNAL_STORAGE):
+        callback()
+        return
+    request_permissions(
+        [Permission.WRITE_EXTERNAL_STORAGE],
+        lambda permissions, grants: Clock.schedule_once(lambda dt: callback(), 0),
+    )
+
+def export_dir(app) -> str:
+    """Pasta das exportações: Download/ComodatoViewer no Android, se acessível.
+
+    O user_data_dir do Kivy é privado do app, então só é usado como último
+    recurso quando o armazenamento compartilhado não pode ser gravado.
+    """
+    if platform != "android":
+        return os.path.join(BASE_DIR, EXPORT_DIR)
+    try:
+        from android.storage import primary_external_storage_path
+        shared = os.path.join(primary_external_storage_path(), "Download", EXPORT_SHARED_DIR)
+        os.makedirs(shared, exist_ok=True)
+        if os.access(shared, os.W_OK):
+            return shared
+    except Exception:
+        pass
+    return os.path.join(app.user_data_dir, EXPORT_DIR)
 
 class ContractRow(RecycleDataViewBehavior, ButtonBehavior, BoxLayout):
     codigo_cliente = StringProperty("")
@@ -431,6 +208,55 @@ class CardClientesScreen(Screen):
         else:
             self.show_message("Erro ao atualizar", message)
 
+    def export_current_view(self, fmt: str = "csv"):
+        """Exporta a visão filtrada atual em segundo plano, com progresso."""
+        request_storage_permission(lambda: self._start_export(fmt))
+
+    def _start_export(self, fmt: str):
+        app = App.get_running_app()
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(export_dir(app), f"comodatos_{stamp}.{fmt}")
+        filters = {
+            "q": self.search_text,
+            "vendedor": self.filtro_vendedor,
+            "pastas": list(self.filtro_pastas),
+        }
+        cancel_event = threading.Event()
+
+        box = BoxLayout(orientation="vertical", padding=dp(16), spacing=dp(12))
+        lbl = Label(text="Preparando exportação...", halign="center", valign="middle")
+        lbl.bind(size=lambda instance, value: setattr(instance, "text_size", value))
+        btn = Button(text="Cancelar", size_hint_y=None, height=dp(40))
+        popup = Popup(title="Exportando", content=box, size_hint=(0.8, 0.4), auto_dismiss=False)
+        btn.bind(on_release=lambda instance: cancel_event.set())
+        box.add_widget(lbl)
+        box.add_widget(btn)
+        popup.open()
+
+        def on_progress(done, total):
+            text = f"{done} de {total} linhas exportadas"
+            Clock.schedule_once(lambda dt: setattr(lbl, "text", text), 0)
+
+        def finish(title, message):
+            popup.dismiss()
+            self.show_message(title, message)
+
+        def work():
+            try:
+                ok = export_filtered(app.db, path, fmt, progress=on_progress,
+                                     cancel_event=cancel_event, format_date=format_date,
+                                     **filters)
+            except Exception as exc:
+                title, message = "Erro ao exportar", f"Não foi possível exportar.\n{exc}"
+            else:
+                if ok:
+                    title, message = "Exportação concluída", f"Arquivo salvo em:\n{path}"
+                else:
+                    title, message = "Exportação cancelada", "Nenhum arquivo foi gerado."
+            Clock.schedule_once(lambda dt: finish(title, message), 0)
+
+        threading.Thread(target=work, daemon=True).start()
+
     def open_about(self):
         """Mostra popup com informações do app."""
         message = (
@@ -445,10 +271,12 @@ class CardClientesScreen(Screen):
         options = [
             ("Filtro", self.open_advanced_filter),
             ("Atualizar base", self.refresh_database),
+            ("Exportar CSV", lambda: self.export_current_view("csv")),
+            ("Exportar XLSX", lambda: self.export_current_view("xlsx")),
             ("Sobre", self.open_about),
         ]
         box = BoxLayout(orientation="vertical", padding=dp(12), spacing=dp(8))
-        modal = ModalView(size_hint=(0.75, None), height=dp(240))
+        modal = ModalView(size_hint=(0.75, None), height=dp(340))
         modal.background = ""
         modal.background_color = (0, 0, 0, 0)
         modal.add_widget(box)
@@ -686,7 +514,11 @@ class ComodatoApp(App):
         dst_path = os.path.join(dst_dir, DB_NAME)
 
         try:
-            data, source_url = download_db_bytes(DB_REMOTE_URLS, timeout=30)
+            data, source_url = download_db_bytes(
+                DB_REMOTE_URLS,
+                timeout=30,
+                scores_path=os.path.join(dst_dir, MIRROR_SCORES_FILE),
+            )
         except (URLError, HTTPError, ssl.SSLError) as exc:
             return False, f"Não foi possível acessar a internet.\n{exc}"
         except Exception as exc:
@@ -0,0 +1,226 @@
+import json
+import os
+import queue
+import ssl
+import threading
+import time
+from http.client import HTTPException
+from urllib.error import URLError
+from urllib.request import urlopen, Request
+
+try:
+    import certifi
+except Exception:
+    certifi = None
+
+MIRROR_SCORES_FILE = "mirrors.json"
+MIRROR_STAGGER = 0.25
+MIRROR_PROBE_BYTES = 64 * 1024
+MIRROR_HANG_FRACTION = 0.5
+_mirror_scores_lock = threading.Lock()
+
+def open_url(url: str, timeout: int = 30):
+    context = None
+    if certifi:
+        context = ssl.create_default_context(cafile=certifi.where())
+    req = Request(url, headers={"User-Agent": "ComodatoViewer/1.0"})
+    if context:
+        return urlopen(req, timeout=timeout, context=context)
+    return urlopen(req, timeout=timeout)
+
+def load_mirror_scores(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def save_mirror_scores(path: str, scores: dict):
+    if not path:
+        return
+    with _mirror_scores_lock:
+        snapshot = json.loads(json.dumps(scores))
+    try:
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump(snapshot, fp, indent=2, sort_keys=True)
+    except OSError:
+        pass
+
+def record_mirror_result(scores: dict, url: str, ok: bool, latency: float = None):
+    """Atualiza latência média (EWMA) e falhas consecutivas de um mirror."""
+    with _mirror_scores_lock:
+        entry = scores.setdefault(url, {"latency": None, "failures": 0, "successes": 0})
+        if ok:
+            previous = entry.get("latency")
+            entry["latency"] = latency if previous is None else 0.7 * previous + 0.3 * latency
+            entry["failures"] = 0
+            entry["successes"] = entry.get("successes", 0) + 1
+        else:
+            entry["failures"] = entry.get("failures", 0) + 1
+        entry["updated"] = time.time()
+
+def record_mirror_lost(scores: dict, url: str, waited: float):
+    """Registra um mirror que perdeu a corrida sem responder a tempo.
+
+    Não conta como falha: só se sabe que a latência é pelo menos `waited`,
+    então a média só é puxada para cima.
+    """
+    with _mirror_scores_lock:
+        entry = scores.setdefault(url, {"latency": None, "failures": 0, "successes": 0})
+        previous = entry.get("latency")
+        if previous is None:
+            entry["latency"] = waited
+        elif waited > previous:
+            entry["latency"] = 0.7 * previous + 0.3 * waited
+        entry["lost"] = entry.get("lost", 0) + 1
+        entry["updated"] = time.time()
+
+def order_mirrors(urls: list, scores: dict) -> list:
+    """Ordena os mirrors: menos falhas recentes primeiro, depois menor latência."""
+    def key(item):
+        index, url = item
+        entry = scores.get(url) or {}
+        latency = entry.get("latency")
+        return (
+            min(entry.get("failures", 0), 5),
+            latency if latency is not None else float("inf"),
+            index,
+        )
+    return [url for _, url in sorted(enumerate(urls), key=key)]
+
+def race_mirrors(urls: list, timeout: int = 30, scores: dict = None):
+    """Dispara os mirrors em paralelo e devolve o primeiro que entregar bytes.
+
+    Cada mirror parte com um atraso de MIRROR_STAGGER em relação ao anterior,
+    então um mirror bem pontuado costuma vencer sem abrir as demais conexões.
+    Os perdedores têm a conexão fechada assim que respondem. Quando a corrida
+    termina, um mirror que ainda não respondeu conta como falha se já esperou
+    MIRROR_HANG_FRACTION do timeout; antes disso só tem a latência puxada para
+    cima (record_mirror_lost), para não punir um mirror saudável mais lento.
+
+    Retorna (response, url, primeiros_bytes, descartados), onde descartados são
+    os mirrors que falharam ou não responderam e não devem entrar numa nova
+    corrida, ou levanta URLError com o erro de cada mirror.
+    """
+    if scores is None:
+        scores = {}
+    results = queue.Queue()
+    lock = threading.Lock()
+    state = {"winner": None, "latency": None, "closed": False}
+    started = {}
+    # Falharam ou ficaram sem resposta: não registram mais nada nesta corrida.
+    failed = set()
+    done = threading.Event()
+
+    def settle(url, ok, latency=None):
+        # Só registra enquanto a corrida está aberta; depois disso o resultado
+        # do mirror já foi decidido por close().
+        with lock:
+            if state["closed"] or url in failed:
+                return
+            started.pop(url, None)
+            if not ok:
+                failed.add(url)
+        record_mirror_result(scores, url, ok, latency)
+
+    def probe(url):
+        start = time.monotonic()
+        with lock:
+            started[url] = start
+        try:
+            response = open_url(url, timeout=timeout)
+        except (OSError, HTTPException) as exc:
+            settle(url, False)
+            results.put((url, None, None, exc))
+            return
+        try:
+            first = response.read(MIRROR_PROBE_BYTES)
+        except (OSError, HTTPException) as exc:
+            response.close()
+            settle(url, False)
+            results.put((url, None, None, exc))
+            return
+        latency = time.monotonic() - start
+        with lock:
+            won = state["winner"] is None
+            if won:
+                state["winner"] = url
+                state["latency"] = latency
+        settle(url, True, latency)
+        if not won:
+            response.close()
+            response = None
+        results.put((url, response, first, None))
+
+    def close():
+        with lock:
+            if state["winner"] is None:
+                state["winner"] = ""
+            state["closed"] = True
+            now = time.monotonic()
+            pending = {url: now - start for url, start in started.items()}
+            failed.update(pending)
+        for url, waited in pending.items():
+            if waited >= timeout * MIRROR_HANG_FRACTION:
+                record_mirror_result(scores, url, False)
+            else:
+                record_mirror_lost(scores, url, waited)
+
+    def launch():
+        for index, url in enumerate(urls):
+            if index and done.wait(MIRROR_STAGGER):
+                return
+            threading.Thread(target=probe, args=(url,), daemon=True).start()
+
+    threading.Thread(target=launch, daemon=True).start()
+
+    errors = {}
+    winner = None
+    deadline = time.monotonic() + timeout + MIRROR_STAGGER * len(urls)
+    try:
+        for _ in urls:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                url, response, first, exc = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if response is not None:
+                winner = (response, url, first)
+                break
+            if exc is not None:
+                errors[url] = exc
+    finally:
+        done.set()
+        close()
+    if winner is not None:
+        return winner + (set(failed),)
+    raise URLError("\n".join(
+        f"{url} -> {errors.get(url, 'tempo esgotado')}" for url in urls
+    ))
+
+def download_db_bytes(urls: list, timeout: int = 30, scores_path: str = None):
+    scores = load_mirror_scores(scores_path)
+    remaining = order_mirrors(urls, scores)
+    errors = []
+    try:
+        while remaining:
+            try:
+                response, url, first, dropped = race_mirrors(remaining, timeout=timeout, scores=scores)
+            except URLError as exc:
+                errors.append(str(exc.reason))
+                break
+            try:
+                with response:
+                    return first + response.read(), url
+            except (OSError, HTTPException) as exc:
+                record_mirror_result(scores, url, False)
+                errors.append(f"{url} -> {exc}")
+                remaining = [u for u in remaining if u != url and u not in dropped]
+    finally:
+        save_mirror_scores(scores_path, scores)
+    raise URLError("Falha ao baixar a base.\n" + "\n".join(errors))
@@ -0,0 +1,104 @@
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+import cli
+from database import DB
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "base.db")
+
+def run_lines(kind: str, keys: list, **kwargs) -> list:
+    out = io.StringIO()
+    cli.run(DB_PATH, kind, io.StringIO("\n".join(keys) + "\n"), out, **kwargs)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+class BatchLookupTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        con = sqlite3.connect(DB_PATH)
+        try:
+            cls.clientes = [r[0] for r in con.execute(
+                "SELECT codigo_cliente FROM CLIENTE ORDER BY codigo_cliente LIMIT 20"
+            )]
+            cls.contratos = [r[0] for r in con.execute(
+                "SELECT numero_contrato FROM CONTRATO ORDER BY numero_contrato LIMIT 20"
+            )]
+            cls.com_produtos, cls.qtd_produtos = con.execute(
+                "SELECT numero_contrato, COUNT(*) FROM PRODUTO GROUP BY numero_contrato LIMIT 1"
+            ).fetchone()
+        finally:
+            con.close()
+
+    def test_output_follows_input_order_with_unknown_and_duplicate_keys(self):
+        keys = list(reversed(self.clientes[:5])) + ["NAO-EXISTE", self.clientes[0]]
+        records = run_lines("clientes", keys)
+
+        self.assertEqual([r["key"] for r in records], keys)
+        self.assertEqual([r["found"] for r in records], [True] * 5 + [False, True])
+        self.assertNotIn("cliente", records[5])
+        self.assertEqual(records[-1], records[4])
+        self.assertEqual(records[0]["cliente"]["codigo_cliente"], keys[0])
+
+    def test_batch_smaller_than_input(self):
+        keys = self.contratos + ["X"] + self.contratos[:3]
+        self.assertEqual(
+            run_lines("contratos", keys, batch_size=3),
+            run_lines("contratos", keys, batch_size=len(keys)),
+        )
+
+    def test_contract_comes_back_with_products(self):
+        (record,) = run_lines("contratos", [self.com_produtos])
+        contrato = record["contrato"]
+        self.assertTrue(record["found"])
+        self.assertEqual(len(contrato["produtos"]), self.qtd_produtos)
+        self.assertEqual(contrato, self._detail(self.com_produtos))
+
+    def _detail(self, numero: str) -> dict:
+        detail = DB(DB_PATH).get_contract_detail(numero)
+        return json.loads(json.dumps(detail, ensure_ascii=False))
+
+    def test_busca_matches_list_screen_search(self):
+        db = DB(DB_PATH)
+        cliente = db.lookup_clientes(self.clientes[:1])[self.clientes[0]]
+        terms = [cliente["nome_fantasia"][:4], "termo-que-nao-existe", cliente["codigo_cliente"]]
+        records = run_lines("busca", terms, batch_size=2)
+
+        self.assertEqual([r["key"] for r in records], terms)
+        self.assertEqual([r["found"] for r in records], [True, False, True])
+        self.assertEqual(records[1]["clientes"], [])
+        for record in (records[0], records[2]):
+            self.assertEqual(record["clientes"], db.list_contracts_advanced(q=record["key"]))
+
+    def test_workers_match_single_process(self):
+        keys = self.contratos + ["X"] + self.contratos[:5]
+        self.assertEqual(
+            run_lines("contratos", keys, batch_size=4, workers=2),
+            run_lines("contratos", keys, batch_size=4, workers=1),
+        )
+
+    def test_input_file_after_options(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "contratos.txt")
+            with open(path, "w", encoding="utf-8") as fp:
+                fp.write("\n".join(self.contratos[:3]) + "\n")
+            outputs = []
+            for argv in (
+                ["contratos", "--workers", "2", "--db", DB_PATH, path],
+                ["contratos", "--workers=2", f"--db={DB_PATH}", path],
+                ["contratos", path, "--db", DB_PATH],
+            ):
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    self.assertEqual(cli.main(argv), 0)
+                outputs.append(out.getvalue())
+
+        self.assertEqual(len(outputs[0].splitlines()), 3)
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import csv
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+import xml.etree.ElementTree as ET
+import zipfile
+from unittest import mock
+
+import database
+import export
+from database import DB
+
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+SCHEMA = """
+CREATE TABLE CLIENTE (
+    codigo_cliente TEXT PRIMARY KEY, nome_fantasia TEXT, razao_social TEXT,
+    cidade TEXT, vendedor TEXT, supervisor TEXT, pasta TEXT
+);
+CREATE TABLE CONTRATO (
+    numero_contrato TEXT PRIMARY KEY, codigo_cliente TEXT NOT NULL,
+    emissao TEXT, vencimento TEXT, tipo TEXT
+);
+CREATE TABLE PRODUTO (
+    id_produto INTEGER PRIMARY KEY AUTOINCREMENT, numero_contrato TEXT NOT NULL,
+    codigo_produto TEXT, descricao TEXT, quantidade INTEGER
+);
+"""
+
+def make_db(path: str, produtos: int = 3):
+    con = sqlite3.connect(path)
+    con.executescript(SCHEMA)
+    con.execute("INSERT INTO CLIENTE VALUES ('C1', 'Bar do Zé', 'Zé Ltda', 'Recife', 'ANA', 'SUP', 'P1')")
+    con.execute("INSERT INTO CLIENTE VALUES ('C2', 'Mercado', 'Mercado SA', 'Olinda', 'RUI', 'SUP', 'P2')")
+    con.execute("INSERT INTO CONTRATO VALUES ('K1', 'C1', '2024-01-05', '2025-01-05', 'FIXO')")
+    con.execute("INSERT INTO CONTRATO VALUES ('K2', 'C2', '2024-02-01', '2025-02-01', 'PROVISÓRIO')")
+    con.executemany(
+        "INSERT INTO PRODUTO (numero_contrato, codigo_produto, descricao, quantidade) VALUES (?, ?, ?, ?)",
+        [("K1", f"P{n}", f"Freezer {n:04d}", n) for n in range(produtos)],
+    )
+    con.commit()
+    con.close()
+
+def sheet_row_counts(path: str) -> list:
+    with zipfile.ZipFile(path) as zf:
+        names = sorted(
+            (n for n in zf.namelist() if n.startswith("xl/worksheets/")),
+            key=lambda n: int(n[len("xl/worksheets/sheet"):-len(".xml")]),
+        )
+        return [len(ET.fromstring(zf.read(n)).find(SHEET_NS + "sheetData")) for n in names]
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out_dir = os.path.join(self.tmp.name, "exports")
+        self.db_path = os.path.join(self.tmp.name, "base.db")
+        make_db(self.db_path)
+        self.db = DB(self.db_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_csv(self, path):
+        with open(path, newline="", encoding="utf-8-sig") as fp:
+            return list(csv.reader(fp, delimiter=";"))
+
+    def test_csv_header_and_rows(self):
+        path = os.path.join(self.out_dir, "out.csv")
+        self.assertTrue(export.export_filtered(self.db, path, "csv", format_date=lambda s: f"<{s}>"))
+
+        rows = self.read_csv(path)
+        self.assertEqual(rows[0], [label for _, label in export.EXPORT_COLUMNS])
+        self.assertEqual(rows[1], [
+            "C1", "Bar do Zé", "Zé Ltda", "Recife", "ANA", "SUP", "P1",
+            "K1", "<2024-01-05>", "<2025-01-05>", "FIXO", "P0", "Freezer 0000", "0",
+        ])
+        self.assertEqual(len(rows), 1 + 3 + 1)
+        # Contrato sem produto sai com a parte de produto vazia.
+        self.assertEqual(rows[-1][7], "K2")
+        self.assertEqual(rows[-1][11:], ["", "", ""])
+        self.assertEqual(os.listdir(self.out_dir), ["out.csv"])
+
+    def test_filters_are_applied(self):
+        path = os.path.join(self.out_dir, "out.csv")
+        export.export_filtered(self.db, path, "csv", vendedor="RUI")
+        self.assertEqual([r[0] for r in self.read_csv(path)[1:]], ["C2"])
+
+    def test_empty_result(self):
+        for fmt in ("csv", "xlsx"):
+            path = os.path.join(self.out_dir, f"out.{fmt}")
+            self.assertTrue(export.export_filtered(self.db, path, fmt, q="nada-disso"))
+        self.assertEqual(len(self.read_csv(os.path.join(self.out_dir, "out.csv"))), 1)
+        self.assertEqual(sheet_row_counts(os.path.join(self.out_dir, "out.xlsx")), [1])
+
+    def test_xlsx_splits_sheets_at_row_limit(self):
+        path = os.path.join(self.tmp.name, "out.xlsx")
+        with mock.patch.object(export, "XLSX_MAX_ROWS", 3):
+            export.write_xlsx(path, ["h"], [[n] for n in range(5)])
+            self.assertEqual(sheet_row_counts(path), [3, 3, 2])
+            export.write_xlsx(path, ["h"], [[n] for n in range(4)])
+            self.assertEqual(sheet_row_counts(path), [3, 3])
+
+        with zipfile.ZipFile(path) as zf:
+            workbook = zf.read("xl/workbook.xml").decode()
+        self.assertIn('name="Contratos"', workbook)
+        self.assertIn('name="Contratos 2"', workbook)
+
+    def test_xlsx_strips_xml_illegal_characters(self):
+        path = os.path.join(self.tmp.name, "out.xlsx")
+        export.write_xlsx(path, ["h"], [["a\x01b\x0bc"]])
+        with zipfile.ZipFile(path) as zf:
+            sheet = ET.fromstring(zf.read("xl/worksheets/sheet1.xml"))
+        texts = [t.text for t in sheet.iter(SHEET_NS + "t")]
+        self.assertEqual(texts, ["h", "abc"])
+
+    def test_cancel_mid_stream_leaves_no_file(self):
+        make_db(os.path.join(self.tmp.name, "big.db"), produtos=50)
+        db = DB(os.path.join(self.tmp.name, "big.db"))
+        cancel_event = threading.Event()
+        seen = []
+
+        def progress(done, total):
+            seen.append(done)
+            if done:
+                cancel_event.set()
+
+        with mock.patch.object(export, "EXPORT_BATCH", 10):
+            ok = export.export_filtered(
+                db, os.path.join(self.out_dir, "out.xlsx"), "xlsx",
+                progress=progress, cancel_event=cancel_event,
+            )
+
+        self.assertFalse(ok)
+        self.assertEqual(seen, [0, 10])
+        self.assertEqual(os.listdir(self.out_dir), [])
+
+    def test_cancel_during_query_leaves_no_file(self):
+        cancel_event = threading.Event()
+        connect = self.db.connect
+
+        def connect_and_cancel():
+            # Cancela com a consulta já em andamento no SQLite.
+            con = connect()
+            cancel_event.set()
+            return con
+
+        os.makedirs(self.out_dir)
+        with mock.patch.object(self.db, "connect", side_effect=connect_and_cancel), \
+                mock.patch.object(self.db, "iter_export_rows") as iter_rows:
+            ok = export.export_filtered(
+                self.db, os.path.join(self.out_dir, "out.csv"), "csv", cancel_event=cancel_event,
+            )
+
+        self.assertFalse(ok)
+        iter_rows.assert_not_called()
+        self.assertEqual(os.listdir(self.out_dir), [])
+
+    def test_cancel_interrupts_running_query(self):
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with mock.patch.object(database, "CANCEL_CHECK_OPS", 1):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.db.count_export_rows(cancel_event=cancel_event)
+            with self.assertRaises(sqlite3.OperationalError):
+                next(self.db.iter_export_rows(cancel_event=cancel_event))
+
+    def test_exported_file_uses_umask_permissions(self):
+        path = os.path.join(self.out_dir, "out.csv")
+        export.export_filtered(self.db, path, "csv")
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o666 & ~export._current_umask())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import mirrors
+
+PAYLOAD = b"SQLite format 3\x00" + os.urandom(200 * 1024)
+TIMEOUT = 5
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    release = threading.Event()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/slow":
+            # Segura a resposta até o teste terminar, como um mirror travado.
+            self.release.wait(TIMEOUT * 2)
+            return
+        if self.path == "/healthy-slow":
+            # Mirror saudável, só mais lento que o /fast.
+            time.sleep(0.5)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(PAYLOAD)
+            return
+        if self.path == "/fail":
+            self.send_error(500)
+            return
+        if self.path == "/truncated":
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(PAYLOAD[:1024])
+            self.close_connection = True
+            return
+        if self.path == "/truncated-body":
+            # Entrega mais que o probe inicial e só quebra no meio do corpo.
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(PAYLOAD[:mirrors.MIRROR_PROBE_BYTES + 1024])
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+class RaceMirrorsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        MirrorHandler.release.clear()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), MirrorHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        MirrorHandler.release.set()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.scores_path = os.path.join(self.tmp.name, mirrors.MIRROR_SCORES_FILE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def url(self, path):
+        return self.base + path
+
+    def test_fast_mirror_wins_and_losers_are_scored(self):
+        slow, fail, truncated, fast = (
+            self.url(p) for p in ("/slow", "/fail", "/truncated", "/fast")
+        )
+        # O mirror travado era o mais rápido até a execução anterior.
+        with open(self.scores_path, "w", encoding="utf-8") as fp:
+            json.dump({slow: {"latency": 0.01, "failures": 0, "successes": 10}}, fp)
+
+        start = time.monotonic()
+        data, url = mirrors.download_db_bytes(
+            [slow, fail, truncated, fast], timeout=TIMEOUT, scores_path=self.scores_path,
+        )
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(url, fast)
+        self.assertEqual(data, PAYLOAD)
+        self.assertLess(elapsed, TIMEOUT / 2)
+
+        scores = mirrors.load_mirror_scores(self.scores_path)
+        self.assertEqual(scores[fast]["failures"], 0)
+        self.assertEqual(scores[fast]["successes"], 1)
+        self.assertIsNotNone(scores[fast]["latency"])
+        for loser in (fail, truncated):
+            self.assertEqual(scores[loser]["failures"], 1, loser)
+        # O travado ainda não chegou ao limite de travamento, mas perde a
+        # média boa que tinha.
+        self.assertEqual(scores[slow]["lost"], 1)
+        self.assertGreater(scores[slow]["latency"], scores[fast]["latency"])
+        self.assertEqual(
+            mirrors.order_mirrors([slow, fail, truncated, fast], scores)[0], fast,
+        )
+
+    def test_hanging_mirror_fails_after_hang_threshold(self):
+        slow, healthy_slow = self.url("/slow"), self.url("/healthy-slow")
+        data, url = mirrors.download_db_bytes(
+            [slow, healthy_slow], timeout=1, scores_path=self.scores_path,
+        )
+
+        self.assertEqual(url, healthy_slow)
+        scores = mirrors.load_mirror_scores(self.scores_path)
+        self.assertEqual(scores[slow]["failures"], 1)
+        self.assertEqual(scores[healthy_slow]["failures"], 0)
+
+    def test_slower_healthy_mirror_is_not_counted_as_failure(self):
+        healthy_slow, fast = self.url("/healthy-slow"), self.url("/fast")
+        for _ in range(3):
+            # Ordem fixa: o mais lento sai na frente e perde toda vez.
+            with mock.patch.object(mirrors, "order_mirrors", side_effect=lambda urls, scores: urls):
+                data, url = mirrors.download_db_bytes(
+                    [healthy_slow, fast], timeout=TIMEOUT, scores_path=self.scores_path,
+                )
+            self.assertEqual(url, fast)
+
+        scores = mirrors.load_mirror_scores(self.scores_path)
+        self.assertEqual(scores[healthy_slow]["failures"], 0)
+        self.assertEqual(scores[healthy_slow]["lost"], 3)
+        self.assertEqual(
+            mirrors.order_mirrors([healthy_slow, fast], scores), [fast, healthy_slow],
+        )
+
+    def test_broken_body_reraces_only_mirrors_that_did_not_fail(self):
+        fail, broken, fast = (
+            self.url(p) for p in ("/fail", "/truncated-body", "/fast")
+        )
+        with mock.patch.object(mirrors, "open_url", side_effect=mirrors.open_url) as open_url:
+            data, url = mirrors.download_db_bytes(
+                [fail, broken, fast], timeout=TIMEOUT, scores_path=self.scores_path,
+            )
+
+        self.assertEqual(url, fast)
+        self.assertEqual(data, PAYLOAD)
+        requested = [call.args[0] for call in open_url.call_args_list]
+        self.assertEqual(requested.count(fail), 1)
+        scores = mirrors.load_mirror_scores(self.scores_path)
+        self.assertEqual(scores[fail]["failures"], 1)
+        self.assertEqual(scores[broken]["failures"], 1)
+        self.assertEqual(scores[fast]["failures"], 0)
+
+if __name__ == "__main__":
+    unittest.main()